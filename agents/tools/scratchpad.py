@@ -0,0 +1,84 @@
+from langchain.agents.format_scratchpad import format_to_openai_function_messages
+from langchain.tools import StructuredTool
+from langchain_core.agents import AgentAction
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel, Field
+from typing import Dict, List, Tuple
+
+
+class RecallObservationArgsSchema(BaseModel):
+    ref: int = Field(description="Reference number of an elided tool result")
+
+
+class ScratchpadCompactor:
+    """
+    Keeps the agent scratchpad within a token budget.
+
+    The newest tool observations are sent verbatim until `max_tokens` is used
+    up; older ones are replaced by a one-line stub with their size, a preview
+    and a reference number (unless the stub would be longer than the result
+    itself, e.g. an empty result or a single count). The agent can fetch any elided result again with
+    the `recall_observation` tool, so nothing is lost, but each step's prompt
+    stays bounded instead of re-sending every earlier query result.
+    """
+
+    def __init__(self, llm: BaseLanguageModel, max_tokens: int = 1500, preview_chars: int = 120):
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self.preview_chars = preview_chars
+        self.observations: Dict[int, str] = {}  # ref -> full observation of the current run
+        self._token_counts: Dict[int, int] = {}
+
+    def _tokens(self, ref: int, observation: str) -> int:
+        if ref not in self._token_counts:
+            self._token_counts[ref] = self.llm.get_num_tokens(observation)
+        return self._token_counts[ref]
+
+    def _stub(self, ref: int, observation: str) -> str:
+        preview = " ".join(observation.split())[:self.preview_chars]
+        return (f"[Result #{ref} elided to save context ({len(observation)} chars). "
+                f"Starts with: {preview}... Call recall_observation with ref={ref} to see it in full.]")
+
+    def compact(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> List[Tuple[AgentAction, str]]:
+        """Return the steps with observations outside the token budget replaced by stubs."""
+        if not intermediate_steps:
+            # New run: forget the previous run's results
+            self.observations.clear()
+            self._token_counts.clear()
+
+        compacted = []
+        used = 0
+        over_budget = False
+        for ref in reversed(range(len(intermediate_steps))):
+            action, observation = intermediate_steps[ref]
+            observation = str(observation)
+            self.observations[ref] = observation
+            tokens = self._tokens(ref, observation)
+            over_budget = over_budget or (bool(compacted) and used + tokens > self.max_tokens)
+            stub = self._stub(ref, observation) if over_budget else None
+            if stub is not None and tokens > self.llm.get_num_tokens(stub):
+                compacted.append((action, stub))
+            else:
+                # The latest result is always kept whole, and so is anything shorter than its stub
+                compacted.append((action, observation))
+                used += tokens
+        compacted.reverse()
+        return compacted
+
+    def format(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> List[BaseMessage]:
+        return format_to_openai_function_messages(self.compact(intermediate_steps))
+
+    def recall(self, ref: int) -> str:
+        """Full text of an earlier tool result of the current run."""
+        if ref not in self.observations:
+            return f"No result with ref={ref} in this run."
+        return self.observations[ref]
+
+    def recall_tool(self) -> StructuredTool:
+        return StructuredTool.from_function(
+            func=self.recall,
+            name="recall_observation",
+            description="Show an earlier tool result in full after it was elided from the conversation",
+            args_schema=RecallObservationArgsSchema,
+        )
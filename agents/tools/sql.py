@@ -1,5 +1,8 @@
 from langchain.tools import tool
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain.agents import AgentExecutor
+from langchain.agents.output_parsers import OpenAIFunctionsAgentOutputParser
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.utils.function_calling import convert_to_openai_function
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.prompts.chat import HumanMessagePromptTemplate
 from langchain_openai import ChatOpenAI
@@ -10,12 +13,17 @@ from agents.tools.report import report_tool  # ✅ From project root
 
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
 from agents.handlers.chat_model_start_handler import ChatModelStartHandler
+from agents.tools.sql_templates import SqlTemplate, SqlTemplateRouter
+from agents.tools.scratchpad import ScratchpadCompactor
+from llm_cache import setup_llm_cache
 
 
 load_dotenv()
+setup_llm_cache()  # temperature=0 agent steps are served from the shared cache
 
 # Load the db path dynamically
 current_dir = os.path.dirname(__file__)
@@ -56,6 +64,27 @@ print("Database Schema:")
 print(database_schema)
 print()
 
+# PRAGMAs that only report on the schema; any other PRAGMA may only be read, not set
+READ_ONLY_PRAGMAS = {"table_info", "table_xinfo", "table_list", "index_list", "index_info",
+                     "index_xinfo", "foreign_key_list"}
+
+def read_only_authorizer(action, arg1, arg2, db_name, trigger_name):
+    """Allow reads only: no writes, no ATTACH, no PRAGMA assignments."""
+    if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE):
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA and (arg2 is None or arg1.lower() in READ_ONLY_PRAGMAS):
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+def execute_query(query: str) -> list:
+    """Run a SQL query on a read-only connection and return the raw rows."""
+    conn = sqlite3.connect(f"file:{file_path}?mode=ro", uri=True)
+    try:
+        conn.set_authorizer(read_only_authorizer)
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
 # Define the tool
 @tool
 def run_sqlite_query(query: str) -> str:
@@ -69,11 +98,7 @@ def run_sqlite_query(query: str) -> str:
         Query results as a formatted string
     """
     try:
-        conn = sqlite3.connect(file_path)
-        cursor = conn.cursor()
-        cursor.execute(query)
-        results = cursor.fetchall()
-        conn.close()
+        results = execute_query(query)
         
         if not results:
             return "Query executed successfully but returned no results."
@@ -82,6 +107,41 @@ def run_sqlite_query(query: str) -> str:
     except Exception as e:
         return f"Error executing query: {str(e)}"
 
+# Canonical questions: listed in the system prompt and answered without the LLM by the fast path
+COMMON_QUERIES = [
+    SqlTemplate(
+        name="Count users",
+        sql="SELECT COUNT(*) FROM users",
+        patterns=["count users", "how many users are there", "how many users", "number of users"],
+        answer="There are {result} users.",
+    ),
+    SqlTemplate(
+        name="Count users with addresses",
+        sql="SELECT COUNT(DISTINCT user_id) FROM addresses",
+        patterns=["count users with addresses", "how many users have an address",
+                  "how many users have a shipping address", "number of users with addresses"],
+        answer="{result} users have an address.",
+    ),
+    SqlTemplate(
+        name="List tables",
+        sql="SELECT name FROM sqlite_master WHERE type='table'",
+        patterns=["list tables", "what tables are there", "show tables"],
+    ),
+    SqlTemplate(
+        name="See table structure",
+        sql="PRAGMA table_info({table_name})",
+        patterns=["see table structure of {table_name}", "describe {table_name}",
+                  "what columns does {table_name} have", "show the structure of the {table_name} table"],
+    ),
+    SqlTemplate(
+        name="Join users and addresses",
+        sql="SELECT * FROM users JOIN addresses ON users.id = addresses.user_id",
+        patterns=["join users and addresses", "list users with their addresses"],
+    ),
+]
+
+common_queries_text = "\n".join(f"- {q.name}: {q.display_sql()}" for q in COMMON_QUERIES)
+
 # Setup the agent with database schema in system prompt
 tools = [run_sqlite_query, report_tool]
 
@@ -97,13 +157,10 @@ IMPORTANT INSTRUCTIONS:
 3. The addresses table likely has a user_id foreign key to link to users
 4. Use appropriate SQL queries (SELECT COUNT(*), SELECT *, JOINs, etc.)
 5. Always provide clear, formatted answers
+6. Older tool results may be elided to save space; call recall_observation with their ref if you need one again
 
 Common queries:
-- Count users: SELECT COUNT(*) FROM users
-- Count users with addresses: SELECT COUNT(DISTINCT user_id) FROM addresses
-- List tables: SELECT name FROM sqlite_master WHERE type='table'
-- See table structure: PRAGMA table_info(table_name)
-- Join users and addresses: SELECT * FROM users JOIN addresses ON users.id = addresses.user_id"""),
+{common_queries_text}"""),
     MessagesPlaceholder(variable_name="chat_history", optional=True),
     HumanMessagePromptTemplate.from_template("{input}"),
     MessagesPlaceholder(variable_name="agent_scratchpad")
@@ -114,13 +171,24 @@ handler = ChatModelStartHandler()
 
 llm = ChatOpenAI(model="gpt-4", temperature=0, callbacks=[handler])
 
-agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
+# Same agent as create_openai_functions_agent, but older tool results are elided
+# from the scratchpad once they exceed the budget (recall_observation brings them back)
+scratchpad = ScratchpadCompactor(llm, max_tokens=1500)
+tools.append(scratchpad.recall_tool())
+
+agent = (
+    RunnablePassthrough.assign(agent_scratchpad=lambda x: scratchpad.format(x["intermediate_steps"]))
+    | prompt
+    | llm.bind(functions=[convert_to_openai_function(t) for t in tools])
+    | OpenAIFunctionsAgentOutputParser()
+)
 
 agent_executor = AgentExecutor(
     agent=agent,
     tools=tools,
     # verbose=True,
-    handle_parsing_errors=True
+    handle_parsing_errors=True,
+    return_intermediate_steps=True,  # lets the fast path learn from successful runs
 )
 
 # Store sessions (you can later extend this to multiple users)
@@ -138,8 +206,35 @@ agent_with_memory = RunnableWithMessageHistory(
     get_session_history,
     input_messages_key="input",   # maps to your {input} variable
     history_messages_key="chat_history",  # maps to MessagesPlaceholder in your prompt
+    output_messages_key="output",
+)
+
+# Fast path: confident template matches run their SQL directly, the rest go to the agent
+router = SqlTemplateRouter(
+    execute=execute_query,
+    templates=list(COMMON_QUERIES),
+    threshold=1.0,
+    learned_path=os.path.join(current_dir, "sql_templates.json"),
 )
 
+def ask(question: str, session_id: str) -> dict:
+    """Answer via a matching SQL template if possible, otherwise via the full agent."""
+    fast = router.route(question)
+    if fast:
+        # Keep the turn in memory so follow-up questions still have context
+        history = get_session_history(session_id)
+        history.add_message(HumanMessage(content=question))
+        history.add_message(AIMessage(content=fast.output))
+        return {"input": question, "output": fast.output, "fast_path": fast.template.name}
+
+    had_history = bool(get_session_history(session_id).messages)
+    response = agent_with_memory.invoke(
+        {"input": question},
+        config={"configurable": {"session_id": session_id}}
+    )
+    router.learn(question, response.get("intermediate_steps", []), had_history=had_history)
+    return response
+
 if __name__ == "__main__":
     print("="*60)
     print("COUNTING USERS WITH SHIPPING ADDRESS")
@@ -147,15 +242,9 @@ if __name__ == "__main__":
 
     session_id = "session_1"
 
-    response = agent_with_memory.invoke(
-        {"input": "How many orders are there? Write the result to an HTML report"},
-        config={"configurable": {"session_id": session_id}}
-    )
+    response = ask("How many orders are there? Write the result to an HTML report", session_id)
 
-    response = agent_with_memory.invoke(
-        {"input": "Repeat the exact same process for users"},
-        config={"configurable": {"session_id": session_id}}
-    )
+    response = ask("Repeat the exact same process for users", session_id)
     
     print("\n" + "="*60)
     print("ANSWER:")
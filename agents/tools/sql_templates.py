@@ -0,0 +1,200 @@
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import os
+import re
+
+# Slot values are interpolated into identifiers (e.g. PRAGMA table_info(...)),
+# so they are restricted to plain words
+SLOT_PATTERN = re.compile(r"\{(\w+)\}")
+SLOT_VALUE = r"(?P<{}>[A-Za-z0-9_]+)"
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s{}]", " ", text.lower()).split())
+
+
+# Words that may appear in a question without changing what it asks
+FILLER_WORDS = {"a", "an", "the", "is", "are", "there", "please", "tell", "me", "our",
+                "in", "of", "s", "currently", "do", "does", "database", "db"}
+
+# Words that flip or narrow the meaning; a question containing one the pattern
+# does not have is never answered from that template
+NEGATION_WORDS = {"no", "not", "none", "never", "nobody", "without", "except", "excluding",
+                  "dont", "don", "doesnt", "doesn", "didn", "isn", "aren", "haven", "hasn", "t"}
+
+
+# Words that point back at earlier turns ("how many of them ...", "same for users")
+REFERRING_WORDS = {"them", "they", "their", "those", "these", "that", "it", "its",
+                   "same", "again", "above", "previous", "also"}
+
+
+def stem(token: str) -> str:
+    """Crude plural folding so "addresses"/"address" and "users"/"user" compare equal."""
+    if token.endswith("sses"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokens(text: str) -> List[str]:
+    return [stem(token) for token in text.split()]
+
+
+@dataclass
+class SqlTemplate:
+    """A natural-language question shape mapped to the SQL that answers it."""
+    name: str
+    sql: str
+    patterns: List[str]
+    answer: str = "{result}"
+    learned: bool = False
+
+    def display_sql(self) -> str:
+        """SQL with slots shown as bare names (safe to embed in a prompt template)."""
+        return SLOT_PATTERN.sub(r"\1", self.sql)
+
+    def match(self, question: str) -> Tuple[float, Dict[str, str]]:
+        """
+        Best score of the (normalized) question against any pattern, plus captured slot values.
+
+        Slot patterns must match the whole question. Plain patterns score the
+        overlap of content words, but only if every pattern word is in the
+        question and the question adds no negation the pattern lacks.
+        """
+        best, best_params = 0.0, {}
+        question_tokens = set(tokens(question))
+        for pattern in self.patterns:
+            pattern = normalize(pattern)
+            if SLOT_PATTERN.search(pattern):
+                escaped = re.escape(pattern).replace(r"\{", "{").replace(r"\}", "}")
+                regex = SLOT_PATTERN.sub(lambda m: SLOT_VALUE.format(m.group(1)), escaped)
+                found = re.fullmatch(regex, question)
+                if found:
+                    return 1.0, found.groupdict()
+                continue
+            pattern_tokens = set(tokens(pattern))
+            if not pattern_tokens <= question_tokens:
+                continue
+            if (question_tokens - pattern_tokens) & NEGATION_WORDS:
+                continue  # "users with no address" must never answer "users with an address"
+            pattern_content = pattern_tokens - FILLER_WORDS
+            question_content = question_tokens - FILLER_WORDS
+            score = len(pattern_content) / len(question_content) if question_content else 1.0
+            if score > best:
+                best, best_params = score, {}
+        return best, best_params
+
+
+@dataclass
+class FastPathResult:
+    template: SqlTemplate
+    score: float
+    rows: List[tuple]
+    output: str
+
+
+@dataclass
+class SqlTemplateRouter:
+    """
+    Answers common database questions straight from a template registry.
+
+    Questions are compared word by word against every template's patterns; when
+    the best score reaches `threshold` (i.e. the question adds no content words
+    beyond filler) the template's SQL is run directly and no LLM is called.
+    Anything less certain returns None so the caller can fall back to the full
+    agent. Successful single-query agent runs are learned as new
+    templates and persisted to `learned_path`.
+
+    `execute` must run queries on a read-only connection: it is the only thing
+    that keeps a learned template from writing to the database.
+    """
+    execute: Callable[..., List[tuple]]
+    templates: List[SqlTemplate]
+    threshold: float = 1.0
+    learned_path: Optional[str] = None
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        if self.learned_path and os.path.exists(self.learned_path):
+            with open(self.learned_path, "r", encoding="utf-8") as f:
+                self.templates.extend(SqlTemplate(**data) for data in json.load(f))
+
+    def route(self, question: str) -> Optional[FastPathResult]:
+        """Run the best matching template, or return None when no match is confident enough."""
+        question = normalize(question)
+        best: Optional[Tuple[float, SqlTemplate, Dict[str, str]]] = None
+        for template in self.templates:
+            score, params = template.match(question)
+            if best is None or score > best[0]:
+                best = (score, template, params)
+
+        if best is None or best[0] < self.threshold:
+            self.misses += 1
+            return None
+
+        score, template, params = best
+        try:
+            rows = self.execute(template.sql.format(**params) if params else template.sql)
+        except Exception:
+            self.misses += 1
+            return None  # let the agent deal with it
+
+        if not rows and (params or template.sql.lstrip().upper().startswith("PRAGMA")):
+            # e.g. PRAGMA table_info on an unknown table: not an answer, ask the agent
+            self.misses += 1
+            return None
+
+        result: Any = rows[0][0] if len(rows) == 1 and len(rows[0]) == 1 else rows
+        self.hits += 1
+        return FastPathResult(template, score, rows, template.answer.format(result=result, **params))
+
+    def learn(self, question: str, intermediate_steps: List[Tuple[Any, Any]],
+              had_history: bool = False) -> Optional[SqlTemplate]:
+        """
+        Turn an agent run that answered with exactly one read-only query into a template.
+
+        Only self-contained questions are learned: if the agent had earlier turns
+        in context, or the question refers back to them, the same wording may
+        mean something else in another session.
+        """
+        if had_history or set(normalize(question).split()) & REFERRING_WORDS:
+            return None
+        if len(intermediate_steps) != 1:
+            return None
+        action, observation = intermediate_steps[0]
+        if action.tool != "run_sqlite_query" or str(observation).startswith("Error"):
+            return None
+
+        tool_input = action.tool_input
+        query = tool_input.get("query") if isinstance(tool_input, dict) else tool_input
+        if not query or SLOT_PATTERN.search(query):
+            return None
+        try:
+            # `execute` is read-only, so anything that would write fails here
+            self.execute(query)
+        except Exception:
+            return None
+
+        pattern = normalize(question).replace("{", "").replace("}", "")
+        for template in self.templates:
+            if template.learned and template.sql.strip() == query.strip():
+                if pattern not in template.patterns:
+                    template.patterns.append(pattern)
+                    self._save()
+                return template
+
+        template = SqlTemplate(name=question, sql=query.strip(), patterns=[pattern], learned=True)
+        self.templates.append(template)
+        self._save()
+        return template
+
+    def _save(self):
+        if not self.learned_path:
+            return
+        learned = [asdict(template) for template in self.templates if template.learned]
+        with open(self.learned_path, "w", encoding="utf-8") as f:
+            json.dump(learned, f, indent=2, ensure_ascii=False)
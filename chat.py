@@ -1,61 +1,77 @@
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.prompts.chat import HumanMessagePromptTemplate, ChatMessagePromptTemplate
 from langchain_openai import ChatOpenAI
-from langchain_core.chat_history import InMemoryChatMessageHistory, BaseChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.messages import HumanMessage, AIMessage
+from chat_journal import ChatJournal, JournaledChatMessageHistory
+from chat_summary import RollingSummaryHistory
+from chat_server import ChatServer, shared_async_client
+from llm_cache import setup_llm_cache
 from dotenv import load_dotenv
-import json
-import os
-from datetime import datetime
+import argparse
+import asyncio
+import atexit
+import time
 
 load_dotenv()
+setup_llm_cache()  # Reuse identical deterministic completions (e.g. summaries) across runs
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--serve", action="store_true", help="run as a multi-session asyncio server")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--max-concurrency", type=int, default=32, help="max completions in flight")
+parser.add_argument("--max-pending", type=int, default=512, help="max queued requests before rejecting")
+args = parser.parse_args()
 
 # ============================================================
 # HELPER FUNCTIONS FOR SAVING/LOADING
 # ============================================================
 
-def save_history_to_json(store, filename="messages.json"):
-    """Save conversation history to a JSON file"""
-    data = {}
-    
-    for session_id, history in store.items():
-        messages_list = []
-        for msg in history.messages:
-            messages_list.append({
-                "type": msg.type,
-                "content": msg.content,
-                "timestamp": datetime.now().isoformat()  # Add timestamp
-            })
-        data[session_id] = messages_list
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    
-    print(f"✅ History saved to {filename}")
-
-
-def load_history_from_json(filename="messages.json"):
-    """Load conversation history from a JSON file"""
-    if not os.path.exists(filename):
-        print(f"⚠️  No existing history file found ({filename})")
-        return {}
-    
-    with open(filename, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    store = {}
-    for session_id, messages_list in data.items():
-        history = InMemoryChatMessageHistory()
-        for msg_data in messages_list:
-            if msg_data["type"] == "human":
-                history.add_message(HumanMessage(content=msg_data["content"]))
-            elif msg_data["type"] == "ai":
-                history.add_message(AIMessage(content=msg_data["content"]))
-        store[session_id] = history
-    
-    print(f"✅ History loaded from {filename}")
-    return store
+def open_history_journal(filename="messages.jsonl"):
+    """Open the append-only history journal (imports messages.json on first run)"""
+    journal = ChatJournal(filename, legacy_filename="messages.json")
+    # Flush the offset index however the process ends (exit, Ctrl+C, EOF, errors)
+    # so the next startup does not have to replay the journal
+    atexit.register(journal.close)
+    print(f"✅ History journal opened ({filename}, {len(journal.sessions)} session(s))")
+    return journal
+
+
+def stream_reply(runnable, history, inputs, config):
+    """Print the reply token by token; Ctrl+C cancels and keeps the partial answer"""
+    start = time.perf_counter()
+    first_token_at = last_token_at = None
+    chunks = []
+    saved_before = len(history.messages)
+
+    print("AI: ", end="", flush=True)
+    stream = runnable.stream(inputs, config=config)
+    try:
+        for chunk in stream:
+            last_token_at = time.perf_counter()
+            if first_token_at is None:
+                first_token_at = last_token_at
+            chunks.append(chunk.content)
+            print(chunk.content, end="", flush=True)
+    except KeyboardInterrupt:
+        # Closing the stream aborts the request. RunnableWithMessageHistory only
+        # saves on normal completion, which may already have happened (fully or
+        # halfway) if Ctrl+C came after the last chunk: only add what is missing
+        stream.close()
+        saved = len(history.messages) - saved_before
+        if saved < 1:
+            history.add_message(HumanMessage(content=inputs["input"]))
+        if saved < 2:
+            history.add_message(AIMessage(content="".join(chunks)))
+            print(" [cancelled]", end="")
+
+    # Measured at the last token, so saving the turn is not counted
+    total = (last_token_at or time.perf_counter()) - start
+    ttft = f"{first_token_at - start:.2f}s" if first_token_at else "n/a"
+    print(f"\n   ⏱️  first token: {ttft} | total: {total:.2f}s\n")
+    return "".join(chunks)
 
 
 # ============================================================
@@ -112,15 +128,30 @@ chat_prompt = ChatPromptTemplate.from_messages([
 ])
 
 # 4️⃣ Chain the prompt and model
-chat = ChatOpenAI(temperature=0.7)
+if args.serve:
+    # One model client (and one pooled HTTP connection set) shared by every session
+    async_client = shared_async_client(args.max_concurrency)
+    chat = ChatOpenAI(temperature=0.7, async_client=async_client)
+else:
+    async_client = None
+    chat = ChatOpenAI(temperature=0.7)
 chain = chat_prompt | chat
 
-# 5️⃣ Load existing history or create new store
-store = load_history_from_json("messages.json")
+# 5️⃣ Open the history journal (sessions are loaded lazily on first use)
+journal = open_history_journal("messages.jsonl")
+store = {}
+
+# Keep the last HISTORY_WINDOW_TOKENS verbatim, fold older turns into a rolling summary
+HISTORY_WINDOW_TOKENS = 1500
+summarizer = ChatOpenAI(temperature=0, async_client=async_client)  # server mode folds through the same pool
 
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
     if session_id not in store:
-        store[session_id] = InMemoryChatMessageHistory()
+        store[session_id] = RollingSummaryHistory(
+            JournaledChatMessageHistory(journal, session_id),
+            summarizer,
+            max_tokens=HISTORY_WINDOW_TOKENS,
+        )
     return store[session_id]
 
 # 6️⃣ Wrap with message history
@@ -131,7 +162,22 @@ chat_with_memory = RunnableWithMessageHistory(
     history_messages_key="history",
 )
 
-# 7️⃣ Interactive loop with dynamic settings
+# 7️⃣ Server mode: same chain, many concurrent sessions
+if args.serve:
+    server = ChatServer(
+        chat_with_memory,
+        max_concurrency=args.max_concurrency,
+        max_pending=args.max_pending,
+        # Summarize after the answer is sent, asynchronously on the shared client
+        on_turn_end=lambda session_id: get_session_history(session_id).afold(),
+    )
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    raise SystemExit(0)
+
+# 8️⃣ Interactive loop with dynamic settings
 session_id = "ebenezer_session_1"
 
 # Configure the assistant
@@ -139,24 +185,26 @@ language = input("Programming language (e.g., Python, JavaScript): ").strip() or
 specialty = input(f"Specialty (e.g., web development, data science): ").strip() or "general development"
 
 print(f"\n✅ I'm now an expert {language} developer specializing in {specialty}!")
-print("Ask me anything (type 'exit' to quit, 'save' to save without quitting)\n")
+print("Ask me anything (type 'exit' to quit, 'save' to save without quitting, Ctrl+C to stop an answer)\n")
 
 while True:
     content = input("You: ")
     
     if content.lower() in ["exit", "quit", "bye"]:
-        # Save before exiting
-        save_history_to_json(store, "messages.json")
+        # Messages are journaled as they happen; nothing left to save
         print("AI: Goodbye 👋")
         break
     
     if content.lower() == "save":
-        # Save without exiting
-        save_history_to_json(store, "messages.json")
+        # Save the offset index without exiting
+        journal.flush_index()
+        print("✅ History index saved")
         continue
 
-    # Invoke with all variables
-    result = chat_with_memory.invoke(
+    # Stream the answer; the completed message is saved to history when it ends
+    stream_reply(
+        chat_with_memory,
+        get_session_history(session_id),
         {
             "language": language,
             "specialty": specialty,
@@ -165,9 +213,13 @@ while True:
         config={"configurable": {"session_id": session_id}},
     )
 
-    print(f"AI: {result.content}\n")
+    # Fold turns that fell out of the window into the summary, now that the answer is shown
+    try:
+        get_session_history(session_id).fold()
+    except KeyboardInterrupt:
+        print("   (summary postponed to the next turn)\n")
 
-# 8️⃣ Show the final message structure
+# 9️⃣ Show the final message structure
 print("\n" + "="*60)
 print("📋 FINAL MESSAGE STRUCTURE")
 print("="*60)
@@ -175,11 +227,11 @@ print("="*60)
 print("\n🔹 System Message:")
 print(f"   'You are an expert {language} developer with years of experience. Your specialty is {specialty}.'")
 
-print("\n🔹 Chat History:")
-history = store.get(session_id)
+print("\n🔹 Chat History (summary + recent window):")
+history = get_session_history(session_id)
 if history and history.messages:
     for i, msg in enumerate(history.messages, 1):
-        role = "👤 Human" if msg.type == "human" else "🤖 AI"
+        role = {"human": "👤 Human", "system": "📝 Summary"}.get(msg.type, "🤖 AI")
         content_preview = msg.content[:60] + "..." if len(msg.content) > 60 else msg.content
         print(f"   {i}. {role}: {content_preview}")
 else:
@@ -190,4 +242,4 @@ print(f"   'As a {language} expert, please help me with: {{user_input}}'")
 
 print("\n" + "="*60)
 print("💡 These messages are combined and sent to the LLM together!")
-print("="*60)
\ No newline at end of file
+print("="*60)
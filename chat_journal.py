@@ -0,0 +1,350 @@
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import threading
+
+
+MESSAGE_CLASSES = {
+    "human": HumanMessage,
+    "ai": AIMessage,
+    "system": SystemMessage,
+}
+
+# Streaming yields chunks (type "AIMessageChunk") that RunnableWithMessageHistory
+# saves as-is; they are journaled under their plain type so they reload
+CHUNK_TYPES = {
+    "AIMessageChunk": "ai",
+    "HumanMessageChunk": "human",
+    "SystemMessageChunk": "system",
+}
+
+
+def canonical_message(message: BaseMessage) -> BaseMessage:
+    """Return the message as one of MESSAGE_CLASSES, converting streamed chunks."""
+    message_type = CHUNK_TYPES.get(message.type, message.type)
+    message_class = MESSAGE_CLASSES.get(message_type)
+    if message_class is None:
+        # Refuse to write a record that read_messages could not load back
+        raise ValueError(f"Cannot journal message of type {message.type!r}")
+    if type(message) is message_class:
+        return message
+    return message_class(content=message.content)
+
+
+class ChatJournal:
+    """
+    Append-only JSONL journal for chat sessions.
+
+    Every message is written exactly once, when it is added, together with the
+    time it was created. Each record points back to the previous record of the
+    same session ("prev" byte offset), so the offset index only has to keep the
+    tail of each session. Opening the journal reads that small index file and
+    nothing else; a session's messages are read lazily the first time it is used.
+
+    Dead records (sessions that were cleared) are dropped by a background
+    compaction thread once they take up more than `compact_ratio` of the file.
+    """
+
+    def __init__(self, filename: str = "messages.jsonl", legacy_filename: Optional[str] = "messages.json",
+                 compact_ratio: float = 0.5, compact_min_bytes: int = 1 << 20):
+        self.filename = filename
+        self.index_filename = filename + ".idx"
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self._lock = threading.RLock()
+        self._compactor: Optional[threading.Thread] = None
+
+        # session_id -> {"tail": offset of last message record, "count": live messages,
+        #                "bytes": live bytes, "summary": offset of latest summary record}
+        self.sessions: Dict[str, dict] = {}
+
+        if not os.path.exists(self.filename) and legacy_filename and os.path.exists(legacy_filename):
+            self._import_legacy_json(legacy_filename)
+
+        self._load_index()
+        self._writer = open(self.filename, "ab")
+        self._reader = open(self.filename, "rb")
+
+    # ------------------------------------------------------------
+    # Index
+    # ------------------------------------------------------------
+
+    def _load_index(self):
+        """Read the offset index, replaying any records written after it was last flushed."""
+        indexed_size = 0
+        if os.path.exists(self.index_filename):
+            try:
+                with open(self.index_filename, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.sessions = data["sessions"]
+                indexed_size = data["journal_size"]
+            except (ValueError, KeyError):
+                self.sessions = {}
+
+        journal_size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        if journal_size < indexed_size:
+            # Journal was replaced behind our back: rebuild from scratch
+            self.sessions = {}
+            indexed_size = 0
+        if journal_size > indexed_size:
+            end = self._replay(indexed_size)
+            if end < journal_size:
+                # Drop a torn final record from a crash, so the next append
+                # starts on a fresh line instead of being glued onto it
+                os.truncate(self.filename, end)
+
+    def _replay(self, start: int) -> int:
+        """
+        Scan records from `start` to the end of the journal and update the index.
+
+        Returns the offset just past the last complete record.
+        """
+        with open(self.filename, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write from a crash
+                self._index_record(json.loads(line), offset, len(line))
+                offset += len(line)
+        return offset
+
+    def _index_record(self, record: dict, offset: int, size: int, sessions: Optional[Dict[str, dict]] = None):
+        sessions = self.sessions if sessions is None else sessions
+        session = sessions.setdefault(record["session_id"], {"tail": None, "count": 0, "bytes": 0})
+        if record.get("op") == "clear":
+            session.update(tail=offset, count=0, bytes=0, summary=None, summary_bytes=0)
+        elif record.get("op") == "summary":
+            # Summaries live outside the message chain; only the latest one is kept
+            live = session["bytes"] - session.get("summary_bytes", 0) + size
+            session.update(bytes=live, summary=offset, summary_bytes=size)
+        else:
+            session.update(tail=offset, count=session["count"] + 1, bytes=session["bytes"] + size)
+
+    def flush_index(self):
+        """Persist the offset index so the next startup does not have to replay the journal."""
+        with self._lock:
+            self._writer.flush()
+            data = {"journal_size": self._writer.tell(), "sessions": self.sessions}
+            tmp = self.index_filename + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.index_filename)
+
+    # ------------------------------------------------------------
+    # Records
+    # ------------------------------------------------------------
+
+    def append(self, session_id: str, message: BaseMessage, timestamp: Optional[str] = None):
+        """Append a single message to the journal."""
+        message = canonical_message(message)
+        with self._lock:
+            session = self.sessions.get(session_id)
+            self._write({
+                "session_id": session_id,
+                "type": message.type,
+                "content": message.content,
+                "timestamp": timestamp or datetime.now().isoformat(),
+                "prev": session["tail"] if session else None,
+            })
+        self._maybe_compact()
+
+    def clear(self, session_id: str):
+        """Append a tombstone that hides every earlier message of the session."""
+        with self._lock:
+            self._write({"session_id": session_id, "op": "clear", "prev": None})
+        self._maybe_compact()
+
+    def write_summary(self, session_id: str, summary: str, covered: int):
+        """Record the rolling summary of the first `covered` messages of a session."""
+        with self._lock:
+            self._write({"session_id": session_id, "op": "summary", "summary": summary, "covered": covered})
+        self._maybe_compact()
+
+    def read_summary(self, session_id: str) -> Optional[dict]:
+        """Return the latest summary record of a session, if any."""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if not session or session.get("summary") is None:
+                return None
+            self._reader.seek(session["summary"])
+            return json.loads(self._reader.readline())
+
+    def _write(self, record: dict):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        offset = self._writer.tell()
+        self._writer.write(line)
+        self._writer.flush()
+        self._index_record(record, offset, len(line))
+
+    def read_records(self, session_id: str) -> List[dict]:
+        """Walk the session's back-pointers and return its live records, oldest first."""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            return self._walk(self._reader, session["tail"] if session else None)
+
+    @staticmethod
+    def _walk(reader, offset: Optional[int]) -> List[dict]:
+        records = []
+        while offset is not None:
+            reader.seek(offset)
+            record = json.loads(reader.readline())
+            if record.get("op") == "clear":
+                break
+            records.append(record)
+            offset = record["prev"]
+        records.reverse()
+        return records
+
+    def read_messages(self, session_id: str) -> List[BaseMessage]:
+        messages = []
+        for record in self.read_records(session_id):
+            message_class = MESSAGE_CLASSES.get(CHUNK_TYPES.get(record["type"], record["type"]))
+            if message_class:
+                messages.append(message_class(content=record["content"]))
+        return messages
+
+    # ------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------
+
+    def _dead_bytes(self) -> int:
+        live = sum(session["bytes"] for session in self.sessions.values())
+        return self._writer.tell() - live
+
+    def _maybe_compact(self):
+        with self._lock:
+            size = self._writer.tell()
+            if size < self.compact_min_bytes or self._dead_bytes() < size * self.compact_ratio:
+                return
+            if self._compactor and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.compact, daemon=True)
+            self._compactor.start()
+
+    def compact(self):
+        """
+        Rewrite the journal with only live records, grouped per session.
+
+        The lock is only held to snapshot the index and, at the end, to copy
+        the records appended meanwhile and swap the files; the bulk of the copy
+        reads the immutable prefix of the journal without blocking writers.
+        """
+        with self._lock:
+            self._writer.flush()
+            snapshot_size = self._writer.tell()
+            snapshot = {session_id: dict(info) for session_id, info in self.sessions.items()}
+
+        tmp = self.filename + ".compact"
+        sessions: Dict[str, dict] = {}
+        with open(self.filename, "rb") as reader, open(tmp, "wb") as out:
+            for session_id, info in snapshot.items():
+                if info.get("summary") is not None:
+                    reader.seek(info["summary"])
+                    self._copy(json.loads(reader.readline()), out, sessions)
+                for record in self._walk(reader, info["tail"]):
+                    self._copy(record, out, sessions)
+
+            with self._lock:
+                # Replay whatever was appended while copying, then swap files
+                self._writer.flush()
+                reader.seek(snapshot_size)
+                for line in reader:
+                    self._copy(json.loads(line), out, sessions)
+                out.flush()
+
+                self._writer.close()
+                self._reader.close()
+                os.replace(tmp, self.filename)
+                self.sessions = {
+                    session_id: info for session_id, info in sessions.items()
+                    if info["count"] or info.get("summary") is not None
+                }
+                self._writer = open(self.filename, "ab")
+                self._reader = open(self.filename, "rb")
+                self.flush_index()
+
+    def _copy(self, record: dict, out, sessions: Dict[str, dict]):
+        """Write a record to the compacted file, relinking it to its session's new tail."""
+        if "prev" in record and record.get("op") != "clear":
+            session = sessions.get(record["session_id"])
+            record["prev"] = session["tail"] if session else None
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        offset = out.tell()
+        out.write(line)
+        self._index_record(record, offset, len(line), sessions)
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+
+    def _import_legacy_json(self, legacy_filename: str):
+        """One-time migration of the old `{session_id: [messages]}` JSON file."""
+        with open(legacy_filename, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        with open(self.filename, "wb") as out:
+            for session_id, messages_list in data.items():
+                prev = None
+                for msg_data in messages_list:
+                    record = {
+                        "session_id": session_id,
+                        "type": msg_data["type"],
+                        "content": msg_data["content"],
+                        "timestamp": msg_data.get("timestamp"),
+                        "prev": prev,
+                    }
+                    prev = out.tell()
+                    out.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+
+        print(f"✅ Imported history from {legacy_filename} into {self.filename}")
+
+    def close(self):
+        """Persist the index and close the files (safe to call more than once)."""
+        if self._writer.closed:
+            return
+        if self._compactor and self._compactor.is_alive():
+            self._compactor.join()
+        self.flush_index()
+        self._writer.close()
+        self._reader.close()
+
+
+class JournaledChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat history for one session backed by a shared ChatJournal.
+
+    Messages are loaded from the journal on first access and every new message
+    is appended to the journal as soon as it is added.
+    """
+
+    def __init__(self, journal: ChatJournal, session_id: str):
+        self.journal = journal
+        self.session_id = session_id
+        self._messages: Optional[List[BaseMessage]] = None
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        if self._messages is None:
+            self._messages = self.journal.read_messages(self.session_id)
+        return self._messages
+
+    def add_message(self, message: BaseMessage) -> None:
+        message = canonical_message(message)
+        self.messages.append(message)
+        self.journal.append(self.session_id, message)
+
+    def clear(self) -> None:
+        self._messages = []
+        self.journal.clear(self.session_id)
+
+    def load_summary(self) -> Tuple[str, int]:
+        """Return the cached rolling summary and how many messages it covers."""
+        record = self.journal.read_summary(self.session_id)
+        return (record["summary"], record["covered"]) if record else ("", 0)
+
+    def save_summary(self, summary: str, covered: int) -> None:
+        self.journal.write_summary(self.session_id, summary, covered)
@@ -0,0 +1,128 @@
+from langchain_core.runnables import Runnable
+from typing import Awaitable, Callable, Optional
+import asyncio
+import httpx
+import json
+import openai
+import time
+import weakref
+
+
+class ChatServer:
+    """
+    Asyncio server that runs many chat sessions concurrently over one chain.
+
+    Protocol: newline-delimited JSON over TCP. Each request line is
+    `{"session_id": ..., "input": ..., "language"?: ..., "specialty"?: ...}` and
+    is answered with `{"token": ...}` lines followed by one `{"done": true, ...}`
+    line (or `{"error": ...}`).
+
+    - Turns of the same session run one at a time (per-session asyncio.Lock),
+      so history is never interleaved.
+    - At most `max_concurrency` completions are in flight at once; they all go
+      through the chain's single model client and its shared connection pool.
+    - When more than `max_pending` requests are waiting, new ones are rejected
+      with a "busy" error instead of queueing without bound, and token writes
+      await `drain()` so slow clients do not buffer whole answers in memory.
+    - `on_turn_end(session_id)` (e.g. summarizing old history) runs after the
+      "done" line is sent, still holding the session lock and a concurrency slot.
+    """
+
+    def __init__(self, runnable: Runnable, language: str = "Python", specialty: str = "general development",
+                 max_concurrency: int = 32, max_pending: int = 512,
+                 on_turn_end: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.runnable = runnable
+        self.on_turn_end = on_turn_end
+        self.language = language
+        self.specialty = specialty
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._pending = 0
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._session_locks[session_id] = lock
+        return lock
+
+    async def _send(self, writer: asyncio.StreamWriter, payload: dict):
+        writer.write((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    async def _answer(self, request: dict, writer: asyncio.StreamWriter):
+        session_id = request["session_id"]
+        inputs = {
+            "language": request.get("language", self.language),
+            "specialty": request.get("specialty", self.specialty),
+            "input": request["input"],
+        }
+
+        lock = self._session_lock(session_id)  # strong reference for the whole turn
+        async with lock:
+            async with self._semaphore:
+                start = time.perf_counter()
+                first_token_at = None
+                async for chunk in self.runnable.astream(
+                    inputs, config={"configurable": {"session_id": session_id}}
+                ):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    await self._send(writer, {"token": chunk.content})
+
+            total = time.perf_counter() - start
+            ttft = first_token_at - start if first_token_at else None
+            await self._send(writer, {"done": True, "ttft": ttft, "total": total})
+
+            if self.on_turn_end:
+                async with self._semaphore:
+                    try:
+                        await self.on_turn_end(session_id)
+                    except Exception as e:
+                        # The client already has its answer; the work is retried next turn
+                        print(f"⚠️  on_turn_end failed for {session_id}: {e}")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    request["session_id"], request["input"]
+                except (ValueError, KeyError, TypeError):
+                    await self._send(writer, {"error": "expected {\"session_id\": ..., \"input\": ...}"})
+                    continue
+
+                if self._pending >= self.max_pending:
+                    await self._send(writer, {"error": "busy"})
+                    continue
+
+                self._pending += 1
+                try:
+                    await self._answer(request, writer)
+                except ConnectionError:
+                    raise
+                except Exception as e:
+                    await self._send(writer, {"error": str(e)})
+                finally:
+                    self._pending -= 1
+        except ConnectionError:
+            pass  # client went away mid-answer; the cancelled turn is not saved
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"✅ Chat server listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def shared_async_client(max_connections: int):
+    """
+    Async OpenAI chat-completions client on one pooled HTTP connection set,
+    sized to the concurrency limit. Pass it to ChatOpenAI as `async_client`.
+    """
+    http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=max_connections,
+                                                        max_keepalive_connections=max_connections))
+    return openai.AsyncOpenAI(http_client=http_client).chat.completions
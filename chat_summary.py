@@ -0,0 +1,97 @@
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain.prompts import PromptTemplate
+from chat_journal import JournaledChatMessageHistory
+from typing import List, Optional, Tuple
+
+
+SUMMARY_PROMPT = PromptTemplate(
+    input_variables=["summary", "new_lines"],
+    template="""Progressively summarize the lines of conversation provided, adding onto the previous summary and returning a new summary.
+Keep names, code identifiers, decisions and open questions; drop pleasantries.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:""",
+)
+
+
+class RollingSummaryHistory(BaseChatMessageHistory):
+    """
+    Token-windowed view over a journaled session.
+
+    The most recent `max_tokens` of conversation are returned verbatim; anything
+    older is folded into a rolling summary that is extended incrementally (only
+    the messages that just fell out of the window are sent to the summarizer)
+    and cached in the journal next to the session, so it is never recomputed.
+
+    Folding is not done while a turn is being saved; call `fold()` (or
+    `afold()`) after each answer has been delivered.
+    """
+
+    def __init__(self, history: JournaledChatMessageHistory, llm: BaseLanguageModel, max_tokens: int = 1500):
+        self.history = history
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self._summary: Optional[str] = None
+        self._covered = 0
+
+    def _load(self):
+        if self._summary is None:
+            self._summary, self._covered = self.history.load_summary()
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        self._load()
+        window = self.history.messages[self._covered:]
+        if not self._summary:
+            return list(window)
+        return [SystemMessage(content=f"Summary of the earlier conversation:\n{self._summary}")] + window
+
+    def add_message(self, message: BaseMessage) -> None:
+        # No folding here: this runs inside the chain's end-of-run listener,
+        # so the caller folds explicitly once the answer has been delivered
+        self._load()
+        self.history.add_message(message)
+
+    def clear(self) -> None:
+        self.history.clear()
+        self._summary, self._covered = "", 0
+
+    def _overflow(self) -> Optional[Tuple[int, str]]:
+        """Index where the window should start and the prompt summarizing what falls out, if anything."""
+        self._load()
+        messages = self.history.messages
+        start = self._covered
+        end = len(messages)
+        while end - start > 2 and self.llm.get_num_tokens_from_messages(messages[start:end]) > self.max_tokens:
+            start += 2  # one human/ai turn at a time
+        if start == self._covered:
+            return None
+
+        new_lines = "\n".join(f"{msg.type}: {msg.content}" for msg in messages[self._covered:start])
+        return start, SUMMARY_PROMPT.format(summary=self._summary or "(none)", new_lines=new_lines)
+
+    def _save(self, start: int, result) -> None:
+        self._summary = getattr(result, "content", result).strip()
+        self._covered = start
+        self.history.save_summary(self._summary, self._covered)
+
+    def fold(self) -> None:
+        """Move the oldest whole turns out of the window until it fits in `max_tokens`."""
+        overflow = self._overflow()
+        if overflow:
+            start, prompt = overflow
+            self._save(start, self.llm.invoke(prompt))
+
+    async def afold(self) -> None:
+        """Async version of `fold`, for use from the event loop."""
+        overflow = self._overflow()
+        if overflow:
+            start, prompt = overflow
+            self._save(start, await self.llm.ainvoke(prompt))
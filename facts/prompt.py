@@ -7,9 +7,15 @@ from langchain_community.document_loaders import TextLoader
 from langchain_openai import ChatOpenAI
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from redundant_filter_retriever import RedundantFilterRetriever
+from semantic_cache import SemanticAnswerCache, sync_chunks
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # shared modules live in the project root
+from llm_cache import setup_llm_cache
 
 load_dotenv()
+setup_llm_cache()  # Reuse identical deterministic completions across runs
 
 # 5️⃣ Initialize your LLM
 llm = ChatOpenAI(temperature=0.3)
@@ -27,19 +33,29 @@ text_splitter = RecursiveCharacterTextSplitter(
 )
 split_docs = text_splitter.split_documents(docs)
 
-# 3️⃣ Create embeddings and build Chroma
+# 3️⃣ Create embeddings and sync Chroma with the current chunks
+# (ids are content hashes: unchanged chunks are kept, edited/removed ones deleted)
 embeddings = OpenAIEmbeddings()
-db = Chroma.from_documents(
-    documents=split_docs,   # ✅ use the chunks, not the full file
-    embedding=embeddings,
+db = Chroma(
+    embedding_function=embeddings,
     persist_directory="./facts/facts_chroma_db"
 )
+chunk_hashes = sync_chunks(db, split_docs)   # ✅ use the chunks, not the full file
 
 retriever = db.as_retriever()  # retrieve top 1 chunks
 
-# Create your custom retriever
+# 7️⃣ Answer cache: near-duplicate questions skip retrieval and the map_reduce calls
+answer_cache = SemanticAnswerCache(
+    embeddings=embeddings,
+    persist_directory="./facts/facts_chroma_db",
+    valid_chunk_hashes=chunk_hashes,
+    max_distance=0.08,  # cosine distance; smaller = stricter paraphrase matching
+)
+
+# Create your custom retriever (it reuses the question vector the cache just computed)
 retriever = RedundantFilterRetriever(
     vectorstore=db,
+    embeddings=answer_cache.query_embeddings(),
     threshold=0.8,      # Similarity threshold for filtering
     k=5,                # Number of documents to return
     fetch_k=20,         # Number of candidates to fetch for MMR
@@ -55,7 +71,16 @@ qa = RetrievalQA.from_chain_type(
     return_source_documents=True,  # optional, to see what context was used (This is optional but very useful for debugging and explainability.)
 )
 
-result = qa.invoke({"query": "What is an interesting fact about the English Language?"})
+def ask(question):
+    """Answer from the cache when possible, otherwise run the full QA chain"""
+    cached = answer_cache.lookup(question)
+    if cached:
+        return cached
+    result = qa.invoke({"query": question})
+    answer_cache.update(question, result)
+    return result
+
+result = ask("What is an interesting fact about the English Language?")
 
 
 print(result["result"]) # the answer
@@ -1,6 +1,7 @@
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
 from langchain.schema.retriever import BaseRetriever
 from typing import List
 from pydantic import Field
@@ -15,7 +16,7 @@ class RedundantFilterRetriever(BaseRetriever):
     
     # Declare all attributes as Pydantic fields
     vectorstore: Chroma = Field(description="Chroma vectorstore instance")
-    embeddings: OpenAIEmbeddings = Field(default_factory=OpenAIEmbeddings)
+    embeddings: Embeddings = Field(default_factory=OpenAIEmbeddings)
     threshold: float = Field(default=0.8, description="Similarity threshold for filtering")
     k: int = Field(default=5, description="Number of documents to return")
     fetch_k: int = Field(default=20, description="Number of candidates to fetch for MMR")
@@ -0,0 +1,152 @@
+from langchain_openai import OpenAIEmbeddings
+from langchain_community.vectorstores import Chroma
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from typing import Iterable, List, Optional, Set
+import hashlib
+import json
+import uuid
+
+
+def chunk_hash(doc: Document) -> str:
+    """Content hash used to tell whether a source chunk is still in the index."""
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def sync_chunks(store: Chroma, docs: List[Document]) -> Set[str]:
+    """
+    Make the vector store hold exactly `docs`, keyed by content hash.
+
+    Chunks that changed or were removed from the source are deleted, new ones
+    are embedded and added, unchanged ones are left alone. Returns the set of
+    current chunk hashes, which is what cached answers are validated against.
+    """
+    current = {}
+    for doc in docs:
+        current.setdefault(chunk_hash(doc), doc)
+
+    existing = set(store.get(include=[])["ids"])
+    stale = [chunk_id for chunk_id in existing if chunk_id not in current]
+    if stale:
+        store.delete(ids=stale)
+    missing = [chunk_id for chunk_id in current if chunk_id not in existing]
+    if missing:
+        store.add_documents([current[chunk_id] for chunk_id in missing], ids=missing)
+    return set(current)
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache for RetrievalQA keyed by question embedding.
+
+    A new question is answered from the cache when its vector is within
+    `max_distance` (cosine distance) of a cached question. Each entry remembers
+    the content hashes of the chunks the answer was built from, and is dropped
+    as soon as any of them is no longer in the index. Exact repeats (after
+    whitespace/case normalization) are found without an embedding call;
+    paraphrase hits cost one embedding call. On a miss that same vector is
+    reused by `update()` and, through `query_embeddings()`, by the retriever.
+    """
+
+    def __init__(self, embeddings: OpenAIEmbeddings, persist_directory: str,
+                 valid_chunk_hashes: Iterable[str], max_distance: float = 0.08,
+                 collection_name: str = "qa_answer_cache"):
+        self.embeddings = embeddings
+        self.max_distance = max_distance
+        self.valid_chunk_hashes: Set[str] = set(valid_chunk_hashes)
+        self._last_query: Optional[tuple] = None  # (question, vector) from the last miss, reused by update()
+        self.store = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=persist_directory,
+            collection_metadata={"hnsw:space": "cosine"},  # distances are 1 - cosine similarity
+        )
+        self.invalidate_stale()
+
+    @staticmethod
+    def _normalize(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    def _is_fresh(self, metadata: dict) -> bool:
+        return set(json.loads(metadata["source_hashes"])) <= self.valid_chunk_hashes
+
+    def _to_result(self, question: str, metadata: dict) -> dict:
+        sources = [Document(**doc) for doc in json.loads(metadata["source_documents"])]
+        return {"query": question, "result": metadata["answer"], "source_documents": sources, "cached": True}
+
+    def invalidate_stale(self):
+        """Delete every entry that depends on a chunk which changed or left the index."""
+        entries = self.store.get(include=["metadatas"])
+        stale = [
+            entry_id for entry_id, metadata in zip(entries["ids"], entries["metadatas"])
+            if not self._is_fresh(metadata)
+        ]
+        if stale:
+            self.store.delete(ids=stale)
+            print(f"🧹 Invalidated {len(stale)} cached answer(s)")
+
+    def query_vector(self, question: str) -> List[float]:
+        """Embedding of `question`, reusing the one computed by the last lookup."""
+        if self._last_query and self._last_query[0] == question:
+            return self._last_query[1]
+        return self.embeddings.embed_query(question)
+
+    def query_embeddings(self) -> "CachedQueryEmbeddings":
+        """Embeddings for the retriever behind this cache (see CachedQueryEmbeddings)."""
+        return CachedQueryEmbeddings(self)
+
+    def lookup(self, question: str) -> Optional[dict]:
+        """Return a cached result for this (or a near-identical) question, if any."""
+        exact = self.store.get(where={"normalized": self._normalize(question)}, include=["metadatas"])
+        for entry_id, metadata in zip(exact["ids"], exact["metadatas"]):
+            if self._is_fresh(metadata):
+                return self._to_result(question, metadata)
+            self.store.delete(ids=[entry_id])
+
+        vector = self.embeddings.embed_query(question)
+        self._last_query = (question, vector)
+        matches = self.store.similarity_search_by_vector_with_relevance_scores(vector, k=1)
+        for doc, distance in matches:
+            if distance <= self.max_distance and self._is_fresh(doc.metadata):
+                return self._to_result(question, doc.metadata)
+        return None
+
+    def update(self, question: str, result: dict):
+        """Store the answer and source documents of a freshly computed result."""
+        sources: List[Document] = result.get("source_documents", [])
+        vector = self.query_vector(question)
+        self.store._collection.add(
+            ids=[str(uuid.uuid4())],
+            embeddings=[vector],
+            documents=[question],
+            metadatas=[{
+                "normalized": self._normalize(question),
+                "answer": result["result"],
+                "source_documents": json.dumps(
+                    [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in sources]
+                ),
+                "source_hashes": json.dumps([chunk_hash(doc) for doc in sources]),
+            }],
+        )
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    The cache's embeddings, except that the question the cache just looked up
+    is not embedded again: a retriever running after a miss gets the vector
+    `lookup()` already paid for.
+    """
+
+    def __init__(self, cache: SemanticAnswerCache):
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.cache.query_vector(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.cache._last_query and self.cache._last_query[0] == text:
+            return self.cache._last_query[1]
+        return await self.cache.embeddings.aembed_query(text)
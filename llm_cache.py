@@ -0,0 +1,173 @@
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from langchain.globals import set_llm_cache
+from typing import Any, Optional
+import atexit
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite")
+
+# llm_string is LangChain's serialized model + call parameters; both the JSON
+# dump ("temperature": 0.7) and the sorted params list ('temperature', 0.7) carry it
+TEMPERATURE_PATTERN = re.compile(r"""["']temperature["']\s*[:,]\s*(-?[0-9.eE+-]+)""")
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    Persistent exact-match cache for LLM and chat model calls.
+
+    Entries are keyed by a hash of the llm_string (model name and every call
+    parameter) and the prompt, which for chat models is the canonical JSON dump
+    of the message list. The store is a single SQLite file in WAL mode, so
+    several processes (chat, agent, facts, main) can share it safely.
+
+    - Only deterministic calls (temperature 0) are cached unless
+      `cache_nondeterministic=True`.
+    - Entries older than `ttl` seconds are treated as misses.
+    - When the stored generations exceed `max_bytes`, the least recently used
+      entries are evicted.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = 256 * 1024 * 1024,
+                 ttl: Optional[float] = 7 * 24 * 3600, cache_nondeterministic: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_nondeterministic = cache_nondeterministic
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at);
+            CREATE TABLE IF NOT EXISTS llm_cache_meta (id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER NOT NULL);
+            INSERT OR IGNORE INTO llm_cache_meta VALUES (0, 0);
+            CREATE TRIGGER IF NOT EXISTS llm_cache_insert AFTER INSERT ON llm_cache BEGIN
+                UPDATE llm_cache_meta SET total_bytes = total_bytes + NEW.size WHERE id = 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS llm_cache_delete AFTER DELETE ON llm_cache BEGIN
+                UPDATE llm_cache_meta SET total_bytes = total_bytes - OLD.size WHERE id = 0;
+            END;
+        """)
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _cacheable(self, llm_string: str) -> bool:
+        if self.cache_nondeterministic:
+            return True
+        match = TEMPERATURE_PATTERN.search(llm_string)
+        try:
+            return match is not None and float(match.group(1)) == 0
+        except ValueError:
+            return False
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if not self._cacheable(llm_string):
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        return [loads(generation) for generation in loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if not self._cacheable(llm_string):
+            return
+
+        key = self._key(prompt, llm_string)
+        value = dumps([dumps(generation) for generation in return_val])
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.execute(
+                    "INSERT INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now, now),
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        (total,) = self._conn.execute("SELECT total_bytes FROM llm_cache_meta WHERE id = 0").fetchone()
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        """Hit-rate counters for this process plus the size of the shared store."""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            (total,) = self._conn.execute("SELECT total_bytes FROM llm_cache_meta WHERE id = 0").fetchone()
+            hits, misses, skipped = self.hits, self.misses, self.skipped
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "skipped": skipped,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+        }
+
+
+def setup_llm_cache(path: Optional[str] = None, report: bool = True, **kwargs) -> SQLiteLLMCache:
+    """Install the shared SQLite cache for every LLM call in this process."""
+    cache = SQLiteLLMCache(path or os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH), **kwargs)
+    set_llm_cache(cache)
+
+    if report:
+        def print_stats():
+            s = cache.stats()
+            if s["hits"] or s["misses"]:
+                print(f"🗄️  LLM cache: {s['hits']}/{s['hits'] + s['misses']} hits ({s['hit_rate']:.0%}), "
+                      f"{s['skipped']} skipped (temperature > 0), {s['entries']} entries")
+        atexit.register(print_stats)
+
+    return cache
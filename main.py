@@ -1,14 +1,22 @@
 from langchain_openai import OpenAI
 from langchain.prompts import PromptTemplate
-from langchain.schema.runnable import RunnableLambda
+from langchain.schema.runnable import RunnablePassthrough
 import argparse
+import asyncio
+import json
+import time
 from dotenv import load_dotenv
+from llm_cache import setup_llm_cache
 
 load_dotenv()  # Load environment variables from .env file
+setup_llm_cache()  # Reuse identical deterministic completions across runs
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--task", default="return a list of numbers")
 parser.add_argument("--language",  default="python")
+parser.add_argument("--batch", help="JSONL file of {\"language\": ..., \"task\": ...} lines")
+parser.add_argument("--output", default="results.jsonl", help="where batch results are written")
+parser.add_argument("--max-concurrency", type=int, default=8)
 args = parser.parse_args()
 
 # Initialize the LLM
@@ -28,21 +36,56 @@ test_prompt = PromptTemplate(
 # Step 1: Chain to generate code
 code_chain = code_prompt | llm
 
-# Step 2: Map the result into a dict { "language": ..., "code": ... }
-wrap_code = RunnableLambda(
-    lambda output: {"language": args.language, "code": output}
+# Step 2: Chain to generate test from code
+test_chain = test_prompt | llm
+
+# Sequential chain: keep every intermediate value, so
+# { language, task } → { language, task, code } → { language, task, code, test }
+# and each pair costs exactly two LLM calls
+sequential_chain = (
+    RunnablePassthrough.assign(code=code_chain)
+    | RunnablePassthrough.assign(test=test_chain)
 )
 
-# Step 3: Chain to generate test from code
-test_chain = test_prompt | llm
 
-# Sequential chain: code → wrap → test
-sequential_chain = code_chain | wrap_code | test_chain
+async def run_batch(input_file, output_file, max_concurrency):
+    """Run every (language, task) pair in input_file, writing results as they finish"""
+    with open(input_file, encoding="utf-8") as f:
+        pairs = [json.loads(line) for line in f if line.strip()]
+
+    # Bounded concurrency with results in completion order, using only ainvoke
+    # (Runnable.batch_as_completed needs a newer langchain-core than the lock pins)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(i, pair):
+        async with semaphore:
+            try:
+                return i, await sequential_chain.ainvoke(pair)
+            except Exception as e:
+                return i, e
+
+    start = time.perf_counter()
+    failed = 0
+    with open(output_file, "w", encoding="utf-8") as out:
+        for next_done in asyncio.as_completed([run_one(i, pair) for i, pair in enumerate(pairs)]):
+            i, result = await next_done
+            if isinstance(result, Exception):
+                failed += 1
+                result = {**pairs[i], "error": str(result)}
+            out.write(json.dumps({"index": i, **result}, ensure_ascii=False) + "\n")
+            out.flush()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {len(pairs)} pairs ({failed} failed) in {elapsed:.1f}s "
+          f"→ {len(pairs) / elapsed:.2f} pairs/s, results in {output_file}")
+
 
-# Run it
-final_test = sequential_chain.invoke({"language": args.language, "task": args.task})
+if args.batch:
+    asyncio.run(run_batch(args.batch, args.output, args.max_concurrency))
+else:
+    result = sequential_chain.invoke({"language": args.language, "task": args.task})
 
-print("=== Generated Code ===")
-print(code_chain.invoke({"language": args.language, "task": args.task}))
-print("\n=== Generated Test ===")
-print(final_test)
+    print("=== Generated Code ===")
+    print(result["code"])
+    print("\n=== Generated Test ===")
+    print(result["test"])